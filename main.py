@@ -1,28 +1,76 @@
+import asyncio
+import logging
 import os
-from fastapi import FastAPI, HTTPException
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
+from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+import msgspec
+import orjson
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, List, Optional, Tuple
 
-from database import db, create_document, get_documents
+from database import db, create_document, create_documents, sum_field, ensure_indexes
 from schemas import MealLog, MealItem, FoodItem, User, Exercise
 
-app = FastAPI(title="Fitness Coach API", version="1.0.0")
+def _log_index_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.getLogger(__name__).warning("Could not ensure indexes: %s", task.exception())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build indexes in the background: when MongoDB is down, startup must not
+    # wait out server selection, and /test reports the outage instead
+    index_task = asyncio.create_task(ensure_indexes())
+    index_task.add_done_callback(_log_index_failure)
+    yield
+    index_task.cancel()
+
+app = FastAPI(
+    title="Fitness Coach API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+# Comma-separated list, e.g. CORS_ORIGINS=https://app.example.com,https://admin.example.com
+# No endpoint uses cookies, so credentials stay off and a plain "*" is sent
+# instead of echoing each request's Origin back
+_ORIGINS = tuple(o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip())
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=list(_ORIGINS),
+    allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Bodies that already fit in one TCP segment gain nothing from compression
+app.add_middleware(GZipMiddleware, minimum_size=1400, compresslevel=5)
+
 @app.get("/")
-def read_root():
-    return {"message": "Fitness Coach Backend running"}
+async def read_root():
+    return ORJSONResponse({"message": "Fitness Coach Backend running"})
+
+# Health snapshot reused for a few seconds so probe bursts don't each hit MongoDB
+_HEALTH_TTL = 5.0
+_health_cache = None
+_health_ts = 0.0
 
 @app.get("/test")
-def test_database():
+async def test_database():
+    global _health_cache, _health_ts
+    if _health_cache is not None and time.monotonic() - _health_ts < _HEALTH_TTL:
+        return _health_cache
+
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -39,7 +87,7 @@ def test_database():
             response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -49,6 +97,8 @@ def test_database():
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:50]}"
 
+    _health_cache = response
+    _health_ts = time.monotonic()
     return response
 
 # ===== Calorie and Meal Logging Endpoints =====
@@ -62,30 +112,198 @@ class LogMealResponse(BaseModel):
     log_id: str
     total_calories: float
 
-@app.post("/api/meal/log", response_model=LogMealResponse)
-def log_meal(payload: LogMealRequest):
-    total = sum((item.calories or 0) * (item.quantity or 1) for item in payload.items)
-    doc = MealLog(
-        user_id=payload.user_id,
-        date=payload.date,
-        items=payload.items,
-        total_calories=total,
-        notes=payload.notes
+# msgspec mirrors of LogMealRequest/MealItem used to decode the log_meal body;
+# keep the constraints in sync with the pydantic models, which drive the docs
+class MsgMealItem(msgspec.Struct):
+    name: str
+    calories: Annotated[float, msgspec.Meta(ge=0)]
+    quantity: Annotated[float, msgspec.Meta(ge=0)] = 1.0
+
+class MsgLogMeal(msgspec.Struct):
+    user_id: str
+    date: str
+    items: List[MsgMealItem]
+    notes: Optional[str] = None
+
+# strict=False coerces numeric strings like pydantic's lax mode. Unlike
+# pydantic (and /api/meal/log_batch), JSON booleans are still rejected for
+# calories/quantity with "Expected `float`, got `bool`"
+_log_meal_decoder = msgspec.json.Decoder(MsgLogMeal, strict=False)
+
+def _items_total(items) -> float:
+    """Calories for a list of MealItem/MsgMealItem"""
+    # A plain loop beats both the genexp+sum() and operator.attrgetter here
+    total = 0.0
+    for item in items:
+        total += item.calories * item.quantity
+    return total
+
+def _json_body_schema(model):
+    """OpenAPI requestBody for routes that parse their body themselves"""
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if ref is not None:
+                return inline(defs[ref.rsplit("/", 1)[-1]])
+            return {k: inline(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [inline(v) for v in node]
+        return node
+
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": inline(schema)}}}}
+
+# These patterns parse msgspec's English error messages as worded in 0.18.4
+# (pinned in requirements.txt); if the wording changes, errors degrade to
+# value_error with loc ["body"]
+_MSGSPEC_ERROR = re.compile(r"^(?P<msg>.*?)(?: - at `\$(?P<path>.*)`)?$")
+_MSGSPEC_PATH_PART = re.compile(r"\.([^.\[]+)|\[(\d+)\]")
+_MSGSPEC_MISSING = re.compile(r"^Object missing required field `(?P<field>[^`]+)`$")
+_MSGSPEC_GE = re.compile(r"^Expected `[^`]+` >= (?P<ge>\S+)$")
+_MSGSPEC_TYPE = re.compile(r"^Expected `(?P<type>[^`]+)`, got")
+_PYDANTIC_TYPE_ERRORS = {
+    "str": "string_type",
+    "float": "float_type",
+    "int": "int_type",
+    "array": "list_type",
+    "object": "model_type",
+}
+
+def _msgspec_validation_error(e: msgspec.ValidationError, body: bytes) -> dict:
+    """Translate a msgspec ValidationError into a FastAPI-style 422 error"""
+    match = _MSGSPEC_ERROR.match(str(e))
+    msg = match["msg"]
+    loc = ["body"]
+    for key, index in _MSGSPEC_PATH_PART.findall(match["path"] or ""):
+        loc.append(key if key else int(index))
+
+    # Walk the body to report the offending input; the untyped re-parse can
+    # still fail (out-of-range numbers, invalid UTF-8 in ignored keys)
+    try:
+        value = msgspec.json.decode(body)
+        for part in loc[1:]:
+            value = value[part]
+    except (msgspec.DecodeError, ValueError, KeyError, IndexError, TypeError):
+        value = None
+
+    if m := _MSGSPEC_MISSING.match(msg):
+        return {"type": "missing", "loc": (*loc, m["field"]), "msg": "Field required", "input": value}
+    if m := _MSGSPEC_GE.match(msg):
+        return {
+            "type": "greater_than_equal",
+            "loc": tuple(loc),
+            "msg": f"Input should be greater than or equal to {m['ge']}",
+            "input": value,
+            "ctx": {"ge": float(m["ge"])},
+        }
+    m = _MSGSPEC_TYPE.match(msg)
+    error_type = _PYDANTIC_TYPE_ERRORS.get(m["type"], "value_error") if m else "value_error"
+    return {"type": error_type, "loc": tuple(loc), "msg": msg, "input": value}
+
+async def _log_meal_payload(request: Request) -> MsgLogMeal:
+    # Decode and validate the raw bytes in one pass with msgspec
+    body = await request.body()
+    try:
+        return _log_meal_decoder.decode(body)
+    except msgspec.ValidationError as e:
+        raise RequestValidationError([_msgspec_validation_error(e, body)])
+    except msgspec.DecodeError as e:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": str(e), "input": None}]
+        )
+
+@app.post("/api/meal/log", response_model=LogMealResponse, openapi_extra=_json_body_schema(LogMealRequest))
+async def log_meal(payload: MsgLogMeal = Depends(_log_meal_payload)):
+    total = _items_total(payload.items)
+    doc = msgspec.to_builtins(payload)
+    doc["total_calories"] = total
+    inserted_id = await create_document("meallog", doc)
+    _invalidate_total(payload.user_id, payload.date)
+    return ORJSONResponse({"log_id": inserted_id, "total_calories": total})
+
+_MAX_BATCH_LOGS = 500
+
+class LogMealBatch(BaseModel):
+    logs: List[LogMealRequest] = Field(..., max_length=_MAX_BATCH_LOGS)
+
+class LogMealBatchResponse(BaseModel):
+    results: List[LogMealResponse]
+
+# Clients logging several entries at once (e.g. buffering for a few ms)
+# should prefer this over repeated /api/meal/log calls: one request, one insert_many
+@app.post("/api/meal/log_batch", response_model=LogMealBatchResponse)
+async def log_meal_batch(payload: LogMealBatch):
+    totals = [_items_total(log.items) for log in payload.logs]
+    # payload was already validated as LogMealBatch, so skip re-validation
+    docs = [
+        MealLog.model_construct(
+            user_id=log.user_id,
+            date=log.date,
+            items=log.items,
+            total_calories=total,
+            notes=log.notes
+        )
+        for log, total in zip(payload.logs, totals)
+    ]
+    try:
+        inserted_ids = await create_documents("meallog", docs)
+    finally:
+        # With ordered=False a BulkWriteError still inserts the valid documents
+        for log in payload.logs:
+            _invalidate_total(log.user_id, log.date)
+    return LogMealBatchResponse.model_construct(
+        results=[
+            LogMealResponse.model_construct(log_id=log_id, total_calories=total)
+            for log_id, total in zip(inserted_ids, totals)
+        ]
     )
-    inserted_id = create_document("meallog", doc)
-    return {"log_id": inserted_id, "total_calories": total}
 
 class DaySummary(BaseModel):
     date: str
     total_calories: float
 
+def _settled_before() -> str:
+    """Dates before this are over in every timezone, so their totals are stable"""
+    return (datetime.now(timezone.utc) - timedelta(days=1)).date().isoformat()
+
+# Per-process LRU: a backfilled log only clears the cache of the worker that
+# took it, so entries expire after a short TTL to bound staleness elsewhere
+_SUMMARY_CACHE_SIZE = 4096
+_SUMMARY_CACHE_TTL = 60.0
+_summary_cache = OrderedDict()
+_summary_generation = 0
+
+def _invalidate_total(user_id: str, date: str):
+    global _summary_generation
+    _summary_generation += 1
+    _summary_cache.pop((user_id, date), None)
+
+async def _cached_total(user_id: str, date: str) -> float:
+    key = (user_id, date)
+    entry = _summary_cache.get(key)
+    if entry is not None and time.monotonic() - entry[1] < _SUMMARY_CACHE_TTL:
+        _summary_cache.move_to_end(key)
+        return entry[0]
+
+    generation = _summary_generation
+    total = await sum_field("meallog", {"user_id": user_id, "date": date}, "total_calories")
+    # Don't store a total that a concurrent log_meal may have made stale
+    if generation == _summary_generation:
+        _summary_cache[key] = (total, time.monotonic())
+        _summary_cache.move_to_end(key)
+        if len(_summary_cache) > _SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return total
+
 @app.get("/api/meal/summary/{user_id}/{date}", response_model=DaySummary)
-def daily_summary(user_id: str, date: str):
-    docs = get_documents("meallog", {"user_id": user_id, "date": date})
-    total = 0.0
-    for d in docs:
-        total += float(d.get("total_calories", 0))
-    return {"date": date, "total_calories": total}
+async def daily_summary(user_id: str, date: str):
+    if date < _settled_before():
+        total = await _cached_total(user_id, date)
+    else:
+        total = await sum_field("meallog", {"user_id": user_id, "date": date}, "total_calories")
+    return DaySummary.model_construct(date=date, total_calories=total)
 
 # ===== Diet Recommendation Endpoint =====
 class DietRequest(BaseModel):
@@ -101,34 +319,48 @@ class DietPlan(BaseModel):
     protein_g: int
     carbs_g: int
     fat_g: int
-    tips: List[str]
+    tips: Tuple[str, ...]
 
-_activity_factors = {
+_activity_factors = MappingProxyType({
     "sedentary": 1.2,
     "light": 1.375,
     "moderate": 1.55,
     "active": 1.725,
     "very_active": 1.9,
-}
+})
+_activity_factor = _activity_factors.__getitem__
+
+# Simple macro split: 30/40/30 (P/C/F), as grams per kcal of target
+_PROTEIN_PER_KCAL = 0.30 / 4
+_CARBS_PER_KCAL = 0.40 / 4
+_FAT_PER_KCAL = 0.30 / 9
+
+_diet_tips = (
+    "Aim for whole foods: lean protein, veggies, fruits, whole grains",
+    "Drink enough water (2-3L/day)",
+    "Prioritize protein in each meal",
+)
 
 @app.post("/api/diet/plan", response_model=DietPlan)
-def diet_plan(req: DietRequest):
+async def diet_plan(req: DietRequest):
     sex = req.sex.lower()
     if sex not in ("male", "female"):
         raise HTTPException(status_code=400, detail="sex must be 'male' or 'female'")
-    if req.activity_level not in _activity_factors:
+    try:
+        factor: float = _activity_factor(req.activity_level)
+    except KeyError:
         raise HTTPException(status_code=400, detail="invalid activity_level")
 
     # Mifflin-St Jeor BMR
     if sex == "male":
-        bmr = 10 * req.weight_kg + 6.25 * req.height_cm - 5 * req.age + 5
+        bmr: float = 10 * req.weight_kg + 6.25 * req.height_cm - 5 * req.age + 5
     else:
         bmr = 10 * req.weight_kg + 6.25 * req.height_cm - 5 * req.age - 161
 
-    tdee = bmr * _activity_factors[req.activity_level]
+    tdee: float = bmr * factor
 
     if req.goal == "lose":
-        target = tdee - 500
+        target: float = tdee - 500
     elif req.goal == "gain":
         target = tdee + 300
     else:
@@ -136,21 +368,12 @@ def diet_plan(req: DietRequest):
 
     target = max(1200, target)  # safety lower bound
 
-    # Simple macro split: 30/40/30 (P/C/F)
-    protein_cal = 0.30 * target
-    carb_cal = 0.40 * target
-    fat_cal = 0.30 * target
-
-    plan = DietPlan(
+    plan = DietPlan.model_construct(
         target_calories=int(round(target)),
-        protein_g=int(round(protein_cal / 4)),
-        carbs_g=int(round(carb_cal / 4)),
-        fat_g=int(round(fat_cal / 9)),
-        tips=[
-            "Aim for whole foods: lean protein, veggies, fruits, whole grains",
-            "Drink enough water (2-3L/day)",
-            "Prioritize protein in each meal",
-        ],
+        protein_g=int(round(target * _PROTEIN_PER_KCAL)),
+        carbs_g=int(round(target * _CARBS_PER_KCAL)),
+        fat_g=int(round(target * _FAT_PER_KCAL)),
+        tips=_diet_tips,
     )
     return plan
 
@@ -160,74 +383,93 @@ class FormGuideRequest(BaseModel):
 
 class FormGuideResponse(BaseModel):
     name: str
-    cues: List[str]
-    mistakes: List[str]
+    cues: Tuple[str, ...]
+    mistakes: Tuple[str, ...]
 
 # A minimal in-code catalog (could be moved to DB later)
-_form_library = {
+_form_library = MappingProxyType({
     "squat": {
-        "cues": [
+        "cues": (
             "Feet shoulder-width, toes slightly out",
             "Brace core, neutral spine",
             "Knees track over toes",
             "Sit back and down until thighs are parallel",
-        ],
-        "mistakes": [
+        ),
+        "mistakes": (
             "Heels lifting",
             "Knees collapsing in",
             "Rounding the back",
-        ],
+        ),
     },
     "push-up": {
-        "cues": [
+        "cues": (
             "Hands under shoulders",
             "Body in a straight line",
             "Elbows ~45 degrees",
             "Chest to floor, full lockout",
-        ],
-        "mistakes": [
+        ),
+        "mistakes": (
             "Sagging hips",
             "Flaring elbows",
             "Half reps",
-        ],
+        ),
     },
     "deadlift": {
-        "cues": [
+        "cues": (
             "Bar over mid-foot",
             "Hinge at hips, flat back",
             "Lats tight, bar close",
             "Push the floor, stand tall",
-        ],
-        "mistakes": [
+        ),
+        "mistakes": (
             "Rounding lower back",
             "Jerking the bar",
             "Bar drifting forward",
-        ],
+        ),
     },
+})
+
+# The catalog is static, so build the response models once at import,
+# keyed by casefolded name so a lookup needs a single normalization
+_form_responses = {
+    name.casefold(): FormGuideResponse.model_construct(name=name, cues=entry["cues"], mistakes=entry["mistakes"])
+    for name, entry in _form_library.items()
 }
 
 @app.post("/api/exercise/form", response_model=FormGuideResponse)
-def exercise_form(req: FormGuideRequest):
-    name = req.exercise.strip().lower()
-    if name not in _form_library:
+async def exercise_form(req: FormGuideRequest):
+    resp = _form_responses.get(req.exercise.strip().casefold())
+    if resp is None:
         raise HTTPException(status_code=404, detail="Exercise not found. Try squat, push-up, or deadlift")
-    entry = _form_library[name]
-    return {"name": name, "cues": entry["cues"], "mistakes": entry["mistakes"]}
+    return resp
 
 # ===== Schema exposure for DB viewer/tools =====
+# Simple reflection: list class names defined in schemas file
+_SCHEMA_BYTES = orjson.dumps({
+    "collections": [
+        "user",
+        "fooditem",
+        "meallog",
+        "exercise",
+    ]
+})
+
 @app.get("/schema")
-def get_schema_definitions():
-    # Simple reflection: list class names defined in schemas file
-    return {
-        "collections": [
-            "user",
-            "fooditem",
-            "meallog",
-            "exercise",
-        ]
-    }
+async def get_schema_definitions():
+    return Response(content=_SCHEMA_BYTES, media_type="application/json")
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    # "auto" resolves to uvloop/httptools, both listed in requirements.txt
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        access_log=False,
+        log_level=os.getenv("LOG_LEVEL", "warning"),
+    )
@@ -37,7 +37,7 @@ class MealItem(BaseModel):
     """An item within a meal log"""
     name: str
     calories: float = Field(..., ge=0)
-    quantity: Optional[float] = Field(1, ge=0, description="Number of servings")
+    quantity: float = Field(1, ge=0, description="Number of servings")
 
 class MealLog(BaseModel):
     """Daily meal logs per user. Collection name: meallog"""
@@ -15,5 +15,10 @@ mkdir -p logs
 echo "Installing dependencies..."
 pip install -r requirements.txt
 echo "Starting FastAPI server..."
-nohup uvicorn main:app --host 0.0.0.0 --port 8000 --reload > logs/server.log 2>&1 
+# Same settings as `python main.py`: one worker per CPU, no access log.
+# --reload cannot be combined with --workers; run uvicorn by hand for that.
+WORKERS=${WEB_CONCURRENCY:-$(nproc 2>/dev/null || echo 1)}
+nohup uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000} \
+  --workers "$WORKERS" --loop auto --http auto \
+  --no-access-log --log-level "${LOG_LEVEL:-warning}" > logs/server.log 2>&1 
 echo "Server started in background"
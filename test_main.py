@@ -0,0 +1,39 @@
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+async def _fake_create_document(collection_name, data):
+    return "log-id"
+
+
+def test_log_meal_out_of_range_number_is_422(monkeypatch):
+    monkeypatch.setattr(main, "create_document", _fake_create_document)
+    body = b'{"user_id":"u","date":"d","items":[{"name":"a","calories":1e999}]}'
+    r = client.post("/api/meal/log", content=body)
+    assert r.status_code == 422
+    error = r.json()["detail"][0]
+    assert error["loc"] == ["body", "items", 0, "calories"]
+    assert error["input"] is None
+
+
+def test_log_meal_invalid_utf8_in_ignored_key_is_422(monkeypatch):
+    monkeypatch.setattr(main, "create_document", _fake_create_document)
+    body = b'{"user_id":"u","date":"d","\xff":1,"items":[{"name":"a","calories":-1}]}'
+    r = client.post("/api/meal/log", content=body)
+    assert r.status_code == 422
+    error = r.json()["detail"][0]
+    assert error["type"] == "greater_than_equal"
+    assert error["loc"] == ["body", "items", 0, "calories"]
+    assert error["input"] is None
+
+
+def test_log_meal_rejects_boolean_calories(monkeypatch):
+    # Documented divergence from /api/meal/log_batch, which coerces true -> 1.0
+    monkeypatch.setattr(main, "create_document", _fake_create_document)
+    body = b'{"user_id":"u","date":"d","items":[{"name":"a","calories":true}]}'
+    r = client.post("/api/meal/log", content=body)
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["type"] == "float_type"